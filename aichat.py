@@ -1,30 +1,76 @@
 import os
 import json
+import math
+import asyncio
+import functools
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from itertools import chain, islice
 from pathlib import Path
 from dotenv import load_dotenv, set_key
-import google.generativeai as genai
+from prompt_toolkit import PromptSession
+from prompt_toolkit.formatted_text import HTML
 from rich.console import Console
-from rich.markdown import Markdown
+from rich.live import Live
 from rich.panel import Panel
+from rich.text import Text
 
 CONFIG_DIR = Path.home() / ".gemini_chat_cli"
 ENV_FILE = CONFIG_DIR / ".env"
-HISTORY_FILE = CONFIG_DIR / "chat_history.json"
+HISTORY_FILE = CONFIG_DIR / "chat_history.jsonl"
 MAX_HISTORY_TOKENS = 4000
+# Compact when history passes the high-water mark, until the verbatim tail is under
+# the low-water mark, so summarization (and any prefix change) only happens every few turns.
+SUMMARY_THRESHOLD = 0.8
+SUMMARY_LOW_WATER = 0.3
+SUMMARY_KEEP_RECENT = 4
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_MODEL_NAME = "gemini-1.5-flash"
+PREFIX_MAX_TOKENS = 1000
+SUMMARY_PROMPT = (
+    "Summarize the following conversation between a user and an AI assistant "
+    "in no more than {max_tokens} tokens. Keep names, facts, decisions and open "
+    "questions; drop pleasantries.\n\n{transcript}"
+)
+EMBEDDING_MODEL_NAME = "models/text-embedding-004"
+SEMANTIC_CACHE_THRESHOLD = 0.93
+SEMANTIC_CACHE_MAX_TURNS = 5
+RENDER_REFRESH_PER_SECOND = 15
+# Finish reasons after which the SDK's chat session can keep using the reply.
+CLEAN_FINISH_REASONS = ("STOP", "MAX_TOKENS", "FINISH_REASON_UNSPECIFIED")
+COMPRESS_MIN_CHARS = 2000
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_JITTER = 0.25
 
 CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
 console = Console()
 
-load_dotenv(dotenv_path=ENV_FILE)
+@functools.lru_cache(maxsize=1)
+def _load_env():
+    """Loads the .env file into the environment once per process."""
+    load_dotenv(dotenv_path=ENV_FILE)
+    return True
 
 GEMINI_MODEL_ID = "gemini"
 GEMINI_DEFAULT_MODEL_NAME = "gemini-1.5-flash"
 GEMINI_ENV_VAR = "GEMINI_API_KEY"
 GEMINI_SERVICE_NAME = "Google Gemini"
 
+# Labels printed every turn, parsed from markup once instead of on each print.
+_USER_PROMPT = HTML("<ansicyan><b>You:</b></ansicyan> ")
+_MODEL_LABEL = Text.from_markup("[bold green]Gemini:[/bold green]")
+_CACHE_HIT_LABEL = Text.from_markup("[bold green]Gemini:[/bold green] [dim]cache hit[/dim]")
+_CALLING_LABEL = Text.from_markup(f"_[dim]Calling Gemini ({GEMINI_DEFAULT_MODEL_NAME})...[/dim]_")
+
 def get_api_key(service_name, env_var_name):
     """Gets API key from env, prompts user if not found, and offers to save."""
+    _load_env()
     api_key = os.getenv(env_var_name)
     if not api_key:
         console.print(f"[yellow]API key for {service_name} ({env_var_name}) not found.[/yellow]")
@@ -44,59 +90,413 @@ def get_api_key(service_name, env_var_name):
             return None
     return api_key
 
+_model = None
+_chat = None
+_chat_stale = False
+
 def initialize_gemini():
     """Initialize Google Gemini client."""
+    import google.generativeai as genai
+    global _model
+    _load_env()
     api_key = get_api_key(GEMINI_SERVICE_NAME, GEMINI_ENV_VAR)
     if not api_key:
         return False
 
     try:
         genai.configure(api_key=api_key)
-
+        _model = genai.GenerativeModel(GEMINI_DEFAULT_MODEL_NAME)
         console.print("[green]Google Gemini client configured.[/green]")
-        return True
     except Exception as e:
         console.print(f"[red]Failed to configure Google Gemini: {e}[/red]")
         if "API key not valid" in str(e):
              console.print("[bold red]Please check if your GEMINI_API_KEY is correct.[/bold red]")
         return False
 
-conversation_history = []
-
-def add_to_history(role, text):
-    """Adds a message to the conversation history."""
+    # A broken history file shouldn't keep the app from starting.
+    load_saved_history()
+    reset_chat()
+    return True
+
+# Summaries live in a rarely-changing stable prefix; per-turn messages go in the tail.
+# Keeping the prefix append-only between consolidations preserves implicit prompt-cache reuse.
+# Messages are stored as (role, text, tokens) tuples.
+_stable_prefix = []
+conversation_history = deque()
+_history_tokens = 0
+_prefix_tokens = 0
+_compaction_task = None
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token)."""
+    return (len(text) + 8) // 4
+
+def add_to_history(role, text, tokens=None):
+    """Adds a message to the conversation history, estimating its tokens unless given."""
+    global _history_tokens
     role = "model" if role == "assistant" else role
-    conversation_history.append({"role": role, "parts": [text]})
+    if tokens is None:
+        tokens = estimate_tokens(text)
+    conversation_history.append((role, text, tokens))
+    _history_tokens += tokens
+    persist_message(role, text)
+
+    # Only compact once a reply has landed, so exchanges are never split.
+    if role == "model" and _history_tokens > SUMMARY_THRESHOLD * MAX_HISTORY_TOKENS and len(conversation_history) > SUMMARY_KEEP_RECENT:
+         schedule_compaction()
+
+    while _history_tokens > MAX_HISTORY_TOKENS and len(conversation_history) > 1:
+         for _ in range(2):
+             _history_tokens -= conversation_history.popleft()[2]
+         mark_chat_stale()
+
+async def summarize_old_messages(old_msgs):
+    """Condenses older messages into a short summary using Gemini."""
+    import google.generativeai as genai
+    transcript = "\n".join(f"{role.capitalize()}: {text}" for role, text, _ in old_msgs)
+    model = genai.GenerativeModel(SUMMARY_MODEL_NAME)
+    response = await model.generate_content_async(SUMMARY_PROMPT.format(max_tokens=SUMMARY_MAX_TOKENS, transcript=transcript))
+    return response.text.strip()
+
+def make_summary_message(summary):
+    """Builds a stable-prefix entry for a summary."""
+    text = f"[Summary of prior turns]: {summary}"
+    return ("model", text, estimate_tokens(text))
+
+def schedule_compaction():
+    """Starts compaction in the background unless one is already running."""
+    global _compaction_task
+    if _compaction_task is None or _compaction_task.done():
+        _compaction_task = asyncio.create_task(compact_history())
+
+async def compact_history():
+    """Moves the oldest messages into a new summary block until the tail is under the low-water mark."""
+    global _history_tokens, _prefix_tokens
+    # The mark applies to the tail alone so a growing prefix doesn't squeeze it;
+    # only cut at a user turn so the kept tail starts a full exchange.
+    target = SUMMARY_LOW_WATER * MAX_HISTORY_TOKENS
+    remaining = _history_tokens - _prefix_tokens
+    cut = 0
+    for index, (role, _, tokens) in enumerate(conversation_history):
+        if index > len(conversation_history) - SUMMARY_KEEP_RECENT:
+            break
+        if role == "user":
+            cut = index
+            if remaining <= target:
+                break
+        remaining -= tokens
+    if cut == 0:
+        return
+    old_msgs = list(islice(conversation_history, cut))
 
-    while len(json.dumps(conversation_history)) > MAX_HISTORY_TOKENS and len(conversation_history) > 1:
-         if len(conversation_history) >= 2:
-             del conversation_history[0:2]
-         else:
-             break
+    try:
+        summary = await summarize_old_messages(old_msgs)
+    except Exception as e:
+        # Nothing was removed; the hard cap in add_to_history will trim instead.
+        console.print(f"[dim]Could not summarize older messages: {e}[/dim]")
+        return
 
-def get_formatted_history():
-    """Returns the history in the format Gemini expects."""
-    return conversation_history
+    # New turns may have been added while summarizing; give up only if the
+    # summarized messages themselves were trimmed or cleared meanwhile.
+    if len(conversation_history) < cut or any(a is not b for a, b in zip(conversation_history, old_msgs)):
+        return
+    for _ in range(cut):
+        conversation_history.popleft()
 
-def ask_gemini(user_prompt):
-    """Handles calls for Google Gemini."""
-    formatted_history = get_formatted_history()
+    block = make_summary_message(summary)
+    _stable_prefix.append(block)
+    _prefix_tokens += block[2]
+    _history_tokens += block[2] - sum(tokens for _, _, tokens in old_msgs)
 
-    try:
-        console.print(f"_[dim]Calling Gemini ({GEMINI_DEFAULT_MODEL_NAME})...[/dim]_")
-        model = genai.GenerativeModel(GEMINI_DEFAULT_MODEL_NAME)
+    if _prefix_tokens > PREFIX_MAX_TOKENS and len(_stable_prefix) > 1:
+        # Only now is the prefix rewritten: fold every block into a single summary.
+        folded = list(_stable_prefix)
+        try:
+            block = make_summary_message(await summarize_old_messages(folded))
+        except Exception as e:
+            console.print(f"[dim]Could not consolidate conversation summaries: {e}[/dim]")
+        else:
+            if _stable_prefix == folded:
+                _stable_prefix[:] = [block]
+                _history_tokens += block[2] - _prefix_tokens
+                _prefix_tokens = block[2]
+
+    mark_chat_stale()
+
+def clear_history():
+    """Empties the conversation history and resets the token counter."""
+    global _history_tokens, _prefix_tokens
+    _stable_prefix.clear()
+    conversation_history.clear()
+    _history_tokens = 0
+    _prefix_tokens = 0
+
+_history_file = None
+
+def persist_message(role, text):
+    """Appends one message to the history file as a JSON line."""
+    global _history_file
+    if _history_file is None:
+        _history_file = open(HISTORY_FILE, "a", encoding="utf-8")
+    _history_file.write(json.dumps({"role": role, "parts": [text]}) + "\n")
+    # One small write per message; flushing keeps the file intact if the app is killed.
+    _history_file.flush()
+
+def rewrite_history_file():
+    """Rewrites the history file so it holds only the current conversation tail."""
+    global _history_file
+    if _history_file is not None:
+        _history_file.close()
+        _history_file = None
+    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
+        for role, text, _ in conversation_history:
+            f.write(json.dumps({"role": role, "parts": [text]}) + "\n")
+
+def load_saved_history():
+    """Replays the history file, keeping the most recent messages that fit the token budget."""
+    global _history_tokens
+    if not HISTORY_FILE.exists():
+        return
 
-        chat = model.start_chat(history=formatted_history)
+    replayed = 0
+    try:
+        with open(HISTORY_FILE, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    msg = json.loads(line)
+                    role, text = msg["role"], msg["parts"][0]
+                    if role not in ("user", "model") or not isinstance(text, str):
+                        continue
+                except (ValueError, KeyError, IndexError, TypeError):
+                    # Skip anything unreadable, e.g. a line cut short by a crash.
+                    continue
+                tokens = estimate_tokens(text)
+                conversation_history.append((role, text, tokens))
+                _history_tokens += tokens
+                replayed += 1
+                while _history_tokens > MAX_HISTORY_TOKENS and len(conversation_history) > 1:
+                     for _ in range(2):
+                         _history_tokens -= conversation_history.popleft()[2]
+
+        if len(conversation_history) < replayed:
+            # Drop what no longer fits so the file doesn't grow across sessions.
+            rewrite_history_file()
+    except OSError as e:
+        console.print(f"[yellow]Could not read saved history from {HISTORY_FILE}: {e}[/yellow]")
+    if conversation_history:
+        console.print(f"[dim]Restored {len(conversation_history)} messages from {HISTORY_FILE}.[/dim]")
+
+def iter_history():
+    """Yields every stored message, stable prefix first."""
+    return chain(_stable_prefix, conversation_history)
 
-        response = chat.send_message(user_prompt)
+def get_formatted_history():
+    """Returns the history in the format Gemini expects."""
+    if not _stable_prefix:
+        return ({"role": role, "parts": [text]} for role, text, _ in conversation_history)
+    # The summary blocks go out as one model turn, so the session starts with
+    # a single model turn followed by exchanges that begin with the user.
+    prefix = {"role": "model", "parts": [text for _, text, _ in _stable_prefix]}
+    return chain([prefix], ({"role": role, "parts": [text]} for role, text, _ in conversation_history))
+
+# (unit-length embedding, prompt, response, turn) for answers given in this conversation.
+# Only answers from the last few turns are reused: older ones may no longer fit the
+# conversation. Each turn adds at most one entry, so the deque needs no more room.
+_semantic_cache = deque(maxlen=SEMANTIC_CACHE_MAX_TURNS)
+_turn_count = 0
+
+async def embed_prompt(prompt):
+    """Returns a unit-length embedding of the normalized prompt, or None on failure."""
+    import google.generativeai as genai
+    normalized = " ".join(prompt.lower().split())
+    try:
+        result = await genai.embed_content_async(model=EMBEDDING_MODEL_NAME, content=normalized)
+        vector = result["embedding"]
+    except Exception as e:
+        console.print(f"[dim]Could not embed prompt for the response cache: {e}[/dim]")
+        return None
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
 
-        ai_response = response.text
+async def count_message_tokens(role, text):
+    """Returns Gemini's token count for a single message, or None on failure."""
+    try:
+        result = await _model.count_tokens_async([{"role": role, "parts": [text]}])
+    except Exception:
+        return None
+    return result.total_tokens
+
+def lookup_semantic_cache(embedding):
+    """Returns the cached response for the most similar recent prompt, if it is close enough."""
+    best_score, best_response = 0.0, None
+    for cached_embedding, _, response, turn in _semantic_cache:
+        if _turn_count - turn > SEMANTIC_CACHE_MAX_TURNS:
+            continue
+        score = sum(a * b for a, b in zip(embedding, cached_embedding))
+        if score > best_score:
+            best_score, best_response = score, response
+    return best_response if best_score >= SEMANTIC_CACHE_THRESHOLD else None
+
+def mark_chat_stale():
+    """Flags the chat session as needing to be re-seeded before the next turn."""
+    global _chat_stale
+    _chat_stale = True
+
+def reset_chat():
+    """Starts a fresh chat session seeded with the current history."""
+    global _chat, _chat_stale
+    _chat = _model.start_chat(history=list(get_formatted_history()))
+    _chat_stale = False
+
+def render_markdown_worker(live, snapshots):
+    """Parses the newest streamed text into Markdown off the event loop and shows it."""
+    from rich.markdown import Markdown
+    while True:
+        text = snapshots.get()
+        if text is None:
+            return
+        live.update(Markdown(text))
+        time.sleep(1 / RENDER_REFRESH_PER_SECOND)
+
+def offer_snapshot(snapshots, text):
+    """Queues text for rendering, replacing any snapshot the worker hasn't picked up yet."""
+    try:
+        snapshots.get_nowait()
+    except queue.Empty:
+        pass
+    snapshots.put_nowait(text)
+
+async def send_with_retry(user_prompt):
+    """Sends a message, retrying transient Gemini errors with exponential backoff and jitter."""
+    from google.api_core import exceptions
+    retryable = (
+        exceptions.ResourceExhausted,
+        exceptions.DeadlineExceeded,
+        exceptions.ServiceUnavailable,
+        exceptions.InternalServerError,
+    )
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return await _chat.send_message_async(user_prompt, stream=True)
+        except retryable as e:
+            # Auth and billing problems won't fix themselves; surface them right away.
+            if attempt == RETRY_ATTEMPTS - 1 or "API key not valid" in str(e) or "billing account" in str(e).lower():
+                raise
+            delay = RETRY_BASE_DELAY * 2 ** attempt + random.random() * RETRY_MAX_JITTER
+            console.print(f"[dim]Gemini call failed ({type(e).__name__}), retrying in {delay:.1f}s...[/dim]")
+            await asyncio.sleep(delay)
+
+# Keeps references to fire-and-forget tasks so they aren't garbage-collected mid-run.
+_background_tasks = set()
+
+def run_in_background(coro):
+    """Starts a task that nobody awaits and keeps it alive until it finishes."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def abandon_response(response_task):
+    """Cancels a speculative Gemini call, or reads its stream to the end if it already opened."""
+    response_task.cancel()
+    try:
+        response = await response_task
+        async for _ in response:
+            pass
+    except (asyncio.CancelledError, Exception):
+        pass
+
+async def discard_tasks(tasks):
+    """Cancels unfinished tasks and collects every result so none is left pending or unretrieved."""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def ask_gemini(user_prompt):
+    """Handles calls for Google Gemini."""
+    from rich.markdown import Markdown
+    global _turn_count
+    _turn_count += 1
+    tasks = []
+    try:
+        console.print(_CALLING_LABEL)
+        if _chat_stale:
+             reset_chat()
+
+        # Start the Gemini call speculatively so a cache miss doesn't also wait on the embedding.
+        embedding_task = asyncio.create_task(embed_prompt(user_prompt))
+        response_task = asyncio.create_task(send_with_retry(user_prompt))
+        # Count only the new message, alongside the other calls, and add it to the running total.
+        prompt_tokens_task = asyncio.create_task(count_message_tokens("user", user_prompt))
+        tasks = [embedding_task, response_task, prompt_tokens_task]
+
+        embedding = await embedding_task
+        cached_response = lookup_semantic_cache(embedding) if embedding is not None else None
+        if cached_response is not None:
+            # Don't wait for it, but don't leave an opened stream unread either.
+            run_in_background(abandon_response(response_task))
+            console.print(_CACHE_HIT_LABEL)
+            console.print(Markdown(cached_response))
+
+            add_to_history("user", user_prompt, await prompt_tokens_task)
+            add_to_history("model", cached_response)
+            # The chat session never saw this exchange (or saw an abandoned one).
+            mark_chat_stale()
+            return cached_response
+
+        response = await response_task
+
+        ai_response = ""
+        reply_tokens = None
+        finish_reason = None
+        console.print(_MODEL_LABEL)
+        with Live(Markdown(""), console=console, refresh_per_second=RENDER_REFRESH_PER_SECOND) as live:
+            # Re-parsing the whole reply per chunk is quadratic, so parsing happens on a
+            # worker thread that only ever sees the latest snapshot.
+            snapshots = queue.Queue(maxsize=1)
+            renderer = threading.Thread(target=render_markdown_worker, args=(live, snapshots), daemon=True)
+            renderer.start()
+            try:
+                async for chunk in response:
+                    if chunk.parts:
+                        ai_response += chunk.text
+                        offer_snapshot(snapshots, ai_response)
+                    # The final chunk reports how many tokens the whole reply used.
+                    if chunk.usage_metadata.candidates_token_count:
+                        reply_tokens = chunk.usage_metadata.candidates_token_count
+                    if chunk.candidates:
+                        finish_reason = chunk.candidates[0].finish_reason
+            finally:
+                snapshots.put(None)
+                renderer.join()
+
+        reason = finish_reason.name if finish_reason is not None else "FINISH_REASON_UNSPECIFIED"
+        stopped_early = reason not in CLEAN_FINISH_REASONS
+        if stopped_early:
+            # Streaming doesn't raise for e.g. SAFETY or RECITATION stops, but the session's
+            # history would on the next send; re-seed it from ours instead.
+            mark_chat_stale()
+
+        if not ai_response:
+            # An empty turn would otherwise be resent with every later request and saved to disk.
+            await discard_tasks([prompt_tokens_task])
+            mark_chat_stale()
+            console.print(f"[yellow]Gemini returned an empty response (finish reason: {reason}).[/yellow]")
+            return None
+        if stopped_early:
+            console.print(f"[yellow]Gemini stopped early (finish reason: {reason}); the reply may be incomplete.[/yellow]")
 
-        add_to_history("user", user_prompt)
-        add_to_history("model", ai_response)
+        add_to_history("user", user_prompt, await prompt_tokens_task)
+        add_to_history("model", ai_response, reply_tokens)
+        # Truncated replies aren't worth serving again.
+        if embedding is not None and not stopped_early:
+             _semantic_cache.append((embedding, user_prompt, ai_response, _turn_count))
 
         return ai_response
     except Exception as e:
+         # A failed or interrupted stream can leave the session half-updated.
+         mark_chat_stale()
+         await discard_tasks(tasks)
+
          error_message = f"Error calling Gemini API: {e}"
          if hasattr(e, 'message'):
               error_message = f"Error calling Gemini API: {e.message}"
@@ -114,6 +514,17 @@ def ask_gemini(user_prompt):
          return None
 
 
+_compress_prompts = False
+
+def compress_prompt(text):
+    """Strips trailing whitespace, drops repeated lines and collapses blank-line runs; inner spacing is kept."""
+    lines = []
+    for line in text.split("\n"):
+        line = line.rstrip()
+        if not lines or not line or line != lines[-1]:
+            lines.append(line)
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
 def display_help():
     """Displays available commands."""
     console.print("\n[bold cyan]Available Commands:[/bold cyan]")
@@ -121,11 +532,49 @@ def display_help():
     console.print("  /quit          - Exit the chatroom.")
     console.print("  /clear         - Clear the conversation history.")
     console.print("  /history       - Show the current conversation history.")
+    console.print(f"  /compress      - Toggle compression of prompts over {COMPRESS_MIN_CHARS} characters.")
     console.print("  Anything else  - Send as a message to Gemini.\n")
 
-def main():
-    global conversation_history
-
+def quit_chat():
+    """Says goodbye; returning True ends the main loop."""
+    console.print("[bold magenta]Goodbye![/bold magenta]")
+    return True
+
+def clear_chat():
+    """Clears the history, caches and chat session."""
+    clear_history()
+    rewrite_history_file()
+    _semantic_cache.clear()
+    reset_chat()
+    console.print(f"[yellow]Conversation history cleared.[/yellow]")
+
+def display_history():
+    """Displays the current conversation history."""
+    from rich.markdown import Markdown
+    if _stable_prefix or conversation_history:
+         console.print(f"\n[bold yellow]Current History:[/bold yellow]")
+         # One document, parsed and rendered once, instead of a print per message.
+         lines = [f"**{role.capitalize()}:** {text}" for role, text, _ in iter_history()]
+         console.print(Markdown("\n\n".join(lines)))
+         console.print("-" * 20)
+    else:
+         console.print(f"[yellow]History is empty.[/yellow]")
+
+def toggle_compression():
+    """Turns prompt compression on or off."""
+    global _compress_prompts
+    _compress_prompts = not _compress_prompts
+    console.print(f"[yellow]Prompt compression {'enabled' if _compress_prompts else 'disabled'}.[/yellow]")
+
+COMMANDS = {
+    "/quit": quit_chat,
+    "/help": display_help,
+    "/clear": clear_chat,
+    "/history": display_history,
+    "/compress": toggle_compression,
+}
+
+async def main():
     console.print(Panel(f"[bold magenta]Welcome to the Gemini Chat CLI![/bold magenta]\nUsing model: {GEMINI_DEFAULT_MODEL_NAME}\nType '/help' for commands.", border_style="blue"))
 
     if not initialize_gemini():
@@ -134,42 +583,30 @@ def main():
         return
 
     console.print(f"Starting chat with: [bold green]{GEMINI_SERVICE_NAME}[/bold green]")
+    session = PromptSession()
 
     while True:
         try:
-            prompt = console.input("[bold cyan]You:[/bold cyan] ")
+            prompt = await session.prompt_async(_USER_PROMPT)
 
-            if not prompt.strip():
+            command = prompt.strip().lower()
+            if not command:
                 continue
 
-            if prompt.strip().lower() == "/quit":
-                console.print("[bold magenta]Goodbye![/bold magenta]")
-                break
-            elif prompt.strip().lower() == "/help":
-                display_help()
+            handler = COMMANDS.get(command)
+            if handler:
+                if handler():
+                    break
                 continue
-            elif prompt.strip().lower() == "/clear":
-                 conversation_history = []
-                 console.print(f"[yellow]Conversation history cleared.[/yellow]")
-                 continue
-            elif prompt.strip().lower() == "/history":
-                 if conversation_history:
-                      console.print(f"\n[bold yellow]Current History:[/bold yellow]")
-                      for msg in conversation_history:
-                           text = msg['parts'][0] if msg['parts'] else ""
-                           role_color = "cyan" if msg['role'] == 'user' else "green"
-                           console.print(f"[bold {role_color}]{msg['role'].capitalize()}:[/bold {role_color}] {text}")
-                      console.print("-" * 20)
-                 else:
-                      console.print(f"[yellow]History is empty.[/yellow]")
-                 continue
-
-            ai_response = ask_gemini(prompt)
+
+            if _compress_prompts and len(prompt) > COMPRESS_MIN_CHARS:
+                original_length = len(prompt)
+                prompt = compress_prompt(prompt)
+                console.print(f"[dim]Compressed prompt from {original_length} to {len(prompt)} characters.[/dim]")
+
+            ai_response = await ask_gemini(prompt)
 
             if ai_response:
-                 md = Markdown(ai_response)
-                 console.print(f"[bold green]Gemini:[/bold green]")
-                 console.print(md)
                  console.print("-" * 30)
 
         except EOFError:
@@ -182,4 +619,8 @@ def main():
             console.print(f"\n[bold red]An unexpected error occurred in the main loop: {e}[/bold red]")
 
 if __name__ == "__main__":
-    main()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        # Ctrl+C while awaiting Gemini cancels main() instead of raising inside the loop.
+        console.print("\n[bold magenta]Interrupted. Goodbye![/bold magenta]")